@@ -0,0 +1,30 @@
+# Gunicorn config for the DavePMEi Reflection API
+# ---------------------------------------------------------------
+# Usage: gunicorn -c gunicorn_conf.py server:app
+#
+# Env:
+#   PORT, WEB_CONCURRENCY (worker processes, default 1), GUNICORN_THREADS
+#
+# Rate limits, the duplicate-save memo and read-cache invalidation live in each
+# process, so every extra worker multiplies the effective per-IP limit and adds its
+# own PG pool and SQLite caches. Scale with threads first; raise WEB_CONCURRENCY
+# only on instances with real cores and memory to spare.
+# ---------------------------------------------------------------
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+# Not derived from os.cpu_count(): inside a container that reports the host's CPUs
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+keepalive = 5
+timeout = 30
+max_requests = 2000
+max_requests_jitter = 200
+
+
+def post_fork(server, worker):
+    # Pools, sockets and the writer thread never survive a fork; build them per worker
+    from server import DB
+    DB.ensure_init()
@@ -3,26 +3,34 @@
 # A lawful reflection server for PMEi (PhilMirrorEnginei.ai)
 # Supports both legacy memory endpoints and lawful reflection mode.
 # Hybrid Neon (Postgres) + SQLite fallback architecture.
+# DATABASE_URL should point at the Neon pooled host (ep-...-pooler.<region>).
 #
 # Endpoints:
 #   GET  /health
 #   GET  /
+#   GET  /openapi.json
 #   POST /save_memory       (auth, legacy)
 #   GET  /get_memory        (auth, legacy)
 #   POST /save_reflection   (auth, lawful)
 #   GET  /get_reflection    (auth, lawful)
 #
 # Env:
-#   MEMORY_API_KEY, ALLOWED_ORIGIN, DATABASE_URL, DB_PATH
-#   PG_MINCONN, PG_MAXCONN, DEBUG_BOOT
+#   MEMORY_API_KEY, ALLOWED_ORIGIN, DATABASE_URL, DB_PATH, MAX_CONTENT_CHARS, MAX_BODY_BYTES
+#   PG_MINCONN, PG_MAXCONN, PG_CONNECT_TIMEOUT (seconds), PG_STATEMENT_TIMEOUT_MS (0 disables)
+#   SQLITE_OPTIMIZE_INTERVAL (seconds, 0 disables), DB_INIT_RETRIES, DEBUG_BOOT
+#   PROXY_HOPS (trusted X-Forwarded-For hops, default 1; 0 = use the socket peer)
+#   WRITE_BATCH_MAX, WRITE_BATCH_WAIT_MS, GET_CACHE_TTL, GET_CACHE_MAX_LIMIT, GET_CACHE_MAX_MB
 #   ENABLE_KEEPALIVE, KEEPALIVE_INTERVAL, SELF_HEALTH_URL
 # ---------------------------------------------------------------
 
-import os, time, threading, re, sqlite3, contextlib, requests
+import os, time, zlib, gzip, threading, sqlite3, contextlib, queue, hmac, hashlib, itertools, requests, orjson, msgspec
 from pathlib import Path
-from collections import defaultdict
-from flask import Flask, request, jsonify
-from functools import wraps
+from collections import OrderedDict
+from flask import Flask, request
+from werkzeug.exceptions import HTTPException
+from werkzeug.middleware.proxy_fix import ProxyFix
+from flask_compress import Compress
+from functools import wraps, lru_cache
 
 app = Flask(__name__)
 
@@ -31,20 +39,82 @@ MEMORY_API_KEY    = os.getenv("MEMORY_API_KEY", "").strip()
 ALLOWED_ORIGIN    = os.getenv("ALLOWED_ORIGIN", "*").strip()
 DATABASE_URL      = os.getenv("DATABASE_URL", "").strip()
 CONFIG_DB_PATH    = os.getenv("DB_PATH", "/var/data/dave.sqlite3").strip()
+OPENAPI_FILENAME  = os.getenv("OPENAPI_FILENAME", "openapi.json").strip()
 MAX_CONTENT_CHARS = int(os.getenv("MAX_CONTENT_CHARS", "65536"))
+# A JSON-escaped char can take 12 bytes (surrogate pair "\ud83e\ude9e"), and most clients
+# escape non-ASCII by default, so the byte cap allows the worst case for a full-size content
+MAX_BODY_BYTES    = int(os.getenv("MAX_BODY_BYTES", str(MAX_CONTENT_CHARS * 12 + 16384)))
 PG_MINCONN        = int(os.getenv("PG_MINCONN", "1"))
-PG_MAXCONN        = int(os.getenv("PG_MAXCONN", "5"))
+PG_MAXCONN        = int(os.getenv("PG_MAXCONN", "10"))
+# Bounds each connect so DB_INIT_RETRIES attempts in post_fork fit inside gunicorn's 30 s timeout
+PG_CONNECT_TIMEOUT = int(os.getenv("PG_CONNECT_TIMEOUT", "5"))
+PG_STATEMENT_TIMEOUT_MS = int(os.getenv("PG_STATEMENT_TIMEOUT_MS", "5000"))
+WRITE_BATCH_MAX   = int(os.getenv("WRITE_BATCH_MAX", "256"))
+WRITE_BATCH_WAIT  = float(os.getenv("WRITE_BATCH_WAIT_MS", "0")) / 1000.0  # optional linger; 0 = none
+GET_CACHE_TTL     = max(1, int(os.getenv("GET_CACHE_TTL", "2")))
+GET_CACHE_MAX_LIMIT = int(os.getenv("GET_CACHE_MAX_LIMIT", "50"))  # larger limits stream uncached
+GET_CACHE_MAX_BYTES = int(os.getenv("GET_CACHE_MAX_MB", "32")) << 20  # per cache, per worker
+STREAM_FETCH_ROWS = 100
+STREAM_CHUNK_BYTES = 65536
+SQLITE_OPTIMIZE_INTERVAL = int(os.getenv("SQLITE_OPTIMIZE_INTERVAL", "900"))
+PROXY_HOPS        = int(os.getenv("PROXY_HOPS", "1"))  # trusted proxies that append X-Forwarded-For
+DB_INIT_RETRIES   = max(1, int(os.getenv("DB_INIT_RETRIES", "3")))
 DEBUG_BOOT        = os.getenv("DEBUG_BOOT", "0") == "1"
 
-SAFE_SEALS = {"ok", "important", "critical", "lawful"}
+# Applied once per SQLite connection (WAL + one fsync per checkpoint, not per commit)
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=1073741824",  # 1 GiB: reads come straight from the page cache, no read() copy
+    "PRAGMA cache_size=-65536",     # 64 MiB per connection
+    "PRAGMA wal_autocheckpoint=1000",
+)
+
+# Oversized bodies are rejected by Werkzeug (413) before any parsing happens
+app.config["MAX_CONTENT_LENGTH"] = MAX_BODY_BYTES
+
+# remote_addr (the rate-limit key) = the address Render's proxy appended, i.e. the rightmost
+# PROXY_HOPS X-Forwarded-For entry; client-written entries to its left are ignored
+if PROXY_HOPS > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS)
+
+# GET payloads run to megabytes of repetitive text; compress them when the client accepts it.
+# Flask-Compress would buffer a streamed body whole, so streams are gzipped chunk by chunk instead.
+GZIP_LEVEL = 4
+app.config.update(COMPRESS_MIMETYPES=["application/json"], COMPRESS_ALGORITHM=["br", "gzip"],
+                  COMPRESS_LEVEL=GZIP_LEVEL, COMPRESS_MIN_SIZE=1024, COMPRESS_STREAMS=False)
+Compress(app)
+
+SAFE_SEALS = frozenset(("ok", "important", "critical", "lawful"))
 GLYPH_MAX = 16
-SLIDE_RE  = re.compile(r"^[tr]-\d{3,6}$")  # t-### for memory, r-### for reflection
-RATE_BUCKET = defaultdict(list)
+FILTER_KEYS = ("user_id", "thread_id", "slide_id", "seal", "role")
+COLS = ("user_id", "thread_id", "slide_id", "glyph_echo", "drift_score",
+        "seal", "role", "content", "checksum_kappa", "ts")
+TS_COL = COLS.index("ts")
+RATE_MAX_BUCKETS = 50_000
+RATE_IDLE_EVICT  = 600    # seconds; an idle bucket has refilled long before this
+RATE_LOCK = threading.Lock()
+RECENT_SAVES_MAX = 4096
+RECENT_SAVE_WINDOW = 60   # seconds a retried save with a client slide_id is answered from memory
+RECENT_SAVES_LOCK = threading.Lock()
 
 # ---------- Helpers ----------
+def now_s() -> int:
+    # Integer epoch seconds straight from the ns clock, no float round-trip
+    return time.time_ns() // 1_000_000_000
+
+def is_slide_id(s: str) -> bool:
+    # t-### for memory, r-### for reflection (3-6 ASCII digits); plain str ops beat a regex here
+    return 5 <= len(s) <= 8 and s[1] == "-" and s[0] in "tr" and s[2:].isdigit() and s.isascii()
+
 def clamp_drift(x) -> float:
-    try: return max(0.0, min(float(x), 0.30))
-    except Exception: return 0.10
+    if type(x) is not float:  # JSON numbers arrive as floats; only strings and ints pay for coercion
+        try: x = float(x)
+        except Exception: return 0.10
+    # Chained compare instead of max(min()); NaN fails both tests and lands on 0.0 as before
+    return x if 0.0 <= x <= 0.30 else (0.30 if x > 0.30 else 0.0)
 
 def sanitize_glyph(g: str) -> str:
     return (g or "🪞").strip()[:GLYPH_MAX]
@@ -53,35 +123,192 @@ def sanitize_seal(s: str) -> str:
     s = (s or "lawful").strip().lower()
     return s if s in SAFE_SEALS else "lawful"
 
+class BoundedLRU(OrderedDict):
+    """OrderedDict capped at maxsize; least recently used keys sit at the front and evict first."""
+
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def get_or_create(self, key, factory):
+        value = self.get(key)
+        if value is None:
+            value = self[key] = factory()
+            if len(self) > self.maxsize:
+                self.popitem(last=False)
+        else:
+            self.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+
+class GenerationCache:
+    """Byte-bounded LRU holding a single generation; the first newer generation drops it all.
+
+    Read caches key their generation on (TTL bucket, DB.write_epoch), so expired or
+    invalidated entries are freed at once instead of lingering until evicted.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.gen = None
+        self.items = OrderedDict()  # key -> (value, nbytes)
+        self.nbytes = 0
+
+    def _current(self, gen) -> bool:
+        # Caller holds the lock. Newer gen: start over. Older (a straggling request): bypass.
+        if gen == self.gen: return True
+        if self.gen is not None and gen < self.gen: return False
+        self.items.clear()
+        self.nbytes, self.gen = 0, gen
+        return True
+
+    def get(self, gen, key):
+        with self.lock:
+            if not self._current(gen): return None
+            hit = self.items.get(key)
+            if hit is None: return None
+            self.items.move_to_end(key)
+            return hit[0]
+
+    def put(self, gen, key, value, nbytes: int):
+        if nbytes > self.max_bytes: return
+        with self.lock:
+            if not self._current(gen): return
+            old = self.items.pop(key, None)
+            if old is not None: self.nbytes -= old[1]
+            self.items[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                self.nbytes -= self.items.popitem(last=False)[1][1]
+
+RATE_BUCKET = BoundedLRU(RATE_MAX_BUCKETS)  # key -> TokenBucket
+RECENT_SAVES = BoundedLRU(RECENT_SAVES_MAX)  # (user_id, thread_id, slide_id, hash(content)) -> ts
+
+class TokenBucket:
+    __slots__ = ("tokens", "last")
+
+    def __init__(self, tokens: float, last: float):
+        self.tokens = tokens
+        self.last = last
+
 def rate_limit_ok(key: str, max_per_min=120):
-    now = time.time()
-    bucket = RATE_BUCKET[key]
-    while bucket and now - bucket[0] > 60:
-        bucket.pop(0)
-    if len(bucket) >= max_per_min:
-        return False
-    bucket.append(now)
-    return True
+    now = time.monotonic()
+    with RATE_LOCK:
+        b = RATE_BUCKET.get_or_create(key, lambda: TokenBucket(float(max_per_min), now))
+        b.tokens = min(float(max_per_min), b.tokens + (now - b.last) * (max_per_min / 60.0))
+        b.last = now
+        # LRU order == last-seen order, so idle buckets are always at the front
+        while True:
+            oldest = next(iter(RATE_BUCKET.values()))
+            if now - oldest.last <= RATE_IDLE_EVICT: break
+            RATE_BUCKET.popitem(last=False)
+        if b.tokens < 1:
+            return False
+        b.tokens -= 1
+        return True
 
 def sanitize_kappa(k: str) -> str:
     return (k or "verified").strip()[:64]
 
+def _text(v) -> str:
+    # null -> "", numbers/booleans -> str(): the same coercion the dict-based handler applied
+    return "" if v is None else (v if type(v) is str else str(v)).strip()
+
+Text = str | int | float | bool | None
+
+class SaveReq(msgspec.Struct, kw_only=True):
+    """POST body for save_memory/save_reflection; decoded and validated in C by msgspec.
+
+    Fields stay as permissive as the old dict handler: null means "use the default",
+    numbers are accepted for text fields and a non-numeric drift_score falls back to 0.10.
+    """
+    user_id: Text = None
+    content: Text = None
+    thread_id: Text = None
+    slide_id: Text = None
+    glyph_echo: Text = None
+    drift_score: float | str | bool | None = None
+    seal: Text = None
+    role: Text = None
+    checksum_kappa: Text = None
+
+    def __post_init__(self):
+        self.user_id = _text(self.user_id)
+        self.content = _text(self.content)
+        self.thread_id = (_text(self.thread_id) or "general")[:64]
+        self.slide_id = _text(self.slide_id)
+        self.glyph_echo = sanitize_glyph(_text(self.glyph_echo))
+        self.drift_score = 0.10 if self.drift_score is None else clamp_drift(self.drift_score)
+        self.seal = sanitize_seal(_text(self.seal))
+        self.role = (_text(self.role) or "assistant")[:32]
+        self.checksum_kappa = sanitize_kappa(_text(self.checksum_kappa))
+
+# strict=False: lenient msgspec coercion; drift_score strings like "0.05" are parsed by clamp_drift
+SAVE_DECODER = msgspec.json.Decoder(SaveReq, strict=False)
+
+def ojson(obj, status=200):
+    return app.response_class(orjson.dumps(obj), status=status, mimetype="application/json")
+
 # ---------- DB Layer ----------
+# Composite indexes matching "WHERE user_id=? [AND thread_id=?] ORDER BY ts DESC LIMIT ?",
+# so the planner walks the index in order instead of sorting.
+SQLITE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_refl_user_ts ON reflections(user_id, ts DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_refl_thread_ts ON reflections(thread_id, ts DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_refl_user_thread_ts ON reflections(user_id, thread_id, ts DESC)",
+    # Unfiltered / seal-only listings: walk ts order instead of scan + sort
+    "CREATE INDEX IF NOT EXISTS idx_refl_ts ON reflections(ts DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_refl_seal_ts ON reflections(seal, ts DESC)",
+)
+PG_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_refl_user_ts ON reflections(user_id, ts DESC) INCLUDE (slide_id, role, seal)",
+    "CREATE INDEX IF NOT EXISTS idx_refl_thread_ts ON reflections(thread_id, ts DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_refl_user_thread_ts ON reflections(user_id, thread_id, ts DESC) INCLUDE (slide_id, role, seal)",
+    # psycopg2 binds client-side, so the planner sees seal='critical' as a literal and can match this
+    "CREATE INDEX IF NOT EXISTS idx_refl_user_critical_ts ON reflections(user_id, ts DESC) WHERE seal = 'critical'",
+    "CREATE INDEX IF NOT EXISTS idx_refl_ts ON reflections(ts DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_refl_seal_ts ON reflections(seal, ts DESC) WHERE seal IN ('important', 'critical')",
+)
+
+class PendingWrite:
+    """A record queued for the group-commit writer; `done` fires once its batch commits."""
+    __slots__ = ("rec", "done", "error")
+
+    def __init__(self, rec):
+        self.rec = rec
+        self.done = threading.Event()
+        self.error = None
+
 class DB:
     kind = "sqlite"
     placeholder = "?"
+    write_queue = queue.Queue()
+    write_epoch = 0  # bumped after every committed batch; part of the read-cache key
+    inited = False
+    init_lock = threading.Lock()
 
     @classmethod
     def try_postgres(cls):
+        """False when no Postgres DSN is configured; raises if one is configured but unusable."""
         if not DATABASE_URL: return False
         if not DATABASE_URL.lower().startswith(("postgres://","postgresql://")):
             return False
         try:
             import psycopg2, psycopg2.pool, psycopg2.extras
             cls.pg_extras = psycopg2.extras
-            cls.pool = psycopg2.pool.SimpleConnectionPool(
-                PG_MINCONN, PG_MAXCONN, dsn=DATABASE_URL,
-                keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=5
+            # Plain client-side-bound cursor.execute() only: no server-side prepared
+            # statements, so the Neon "-pooler" (pgbouncer transaction mode) is safe.
+            opts = {"options": f"-c statement_timeout={PG_STATEMENT_TIMEOUT_MS}"} if PG_STATEMENT_TIMEOUT_MS else {}
+            cls.pool = psycopg2.pool.ThreadedConnectionPool(
+                PG_MINCONN, PG_MAXCONN, dsn=DATABASE_URL, connect_timeout=PG_CONNECT_TIMEOUT,
+                keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=5,
+                **opts
             )
             with cls.get_pg_conn() as conn:
                 with conn.cursor() as cur:
@@ -100,31 +327,68 @@ class DB:
                           ts BIGINT NOT NULL
                         );
                     """)
+                    for ddl in PG_INDEXES:
+                        cur.execute(ddl)
                 conn.commit()
             cls.kind = "postgres"
             cls.placeholder = "%s"
             print("[DB] Postgres connected")
             return True
         except Exception as e:
+            # DATABASE_URL is set, so Postgres is the store: never fall back to a local SQLite
+            # (that would split data across workers). Raise so ensure_init retries, then 503s.
             print(f"[DB] Postgres failed: {e}")
-            return False
+            pool = getattr(cls, "pool", None)
+            if pool is not None:
+                try: pool.closeall()
+                except Exception: pass
+                cls.pool = None
+            raise
 
     @classmethod
     @contextlib.contextmanager
     def get_pg_conn(cls):
         conn = cls.pool.getconn()
         try: yield conn
-        finally: cls.pool.putconn(conn)
+        finally:
+            try: conn.rollback()  # never hand back a connection idle in a transaction
+            except Exception: pass  # server dropped it (e.g. Neon suspend); discarded below
+            finally: cls.pool.putconn(conn, close=bool(conn.closed))
+
+    @classmethod
+    def _open_sqlite(cls):
+        if CONFIG_DB_PATH == ":memory:":
+            # Plain :memory: is private to one connection; the writer and every reader thread
+            # must see the same database, so share one named in-memory DB per process. No WAL
+            # here, and read_uncommitted keeps readers off shared-cache table locks.
+            conn = sqlite3.connect(f"file:pmei-{os.getpid()}?mode=memory&cache=shared",
+                                   uri=True, check_same_thread=False)
+            conn.execute("PRAGMA read_uncommitted=1")
+            return conn
+        conn = sqlite3.connect(CONFIG_DB_PATH, check_same_thread=False)
+        if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+            conn.execute("PRAGMA page_size=8192")  # only takes effect on a brand-new file, before WAL
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @classmethod
+    def sqlite_conn(cls):
+        """This thread's read connection, opened on first use; WAL lets them all read in parallel."""
+        conn = getattr(cls.sqlite_local, "conn", None)
+        if conn is None:
+            conn = cls.sqlite_local.conn = cls._open_sqlite()
+        return conn
 
     @classmethod
     def init_sqlite(cls):
-        cfg = Path(CONFIG_DB_PATH)
-        cfg.parent.mkdir(parents=True, exist_ok=True)
-        cls.sqlite = sqlite3.connect(str(cfg), check_same_thread=False)
-        cls.sqlite.row_factory = sqlite3.Row
-        cls.sqlite.execute("""
+        if CONFIG_DB_PATH != ":memory:":
+            Path(CONFIG_DB_PATH).parent.mkdir(parents=True, exist_ok=True)
+        cls.sqlite_writer = conn = cls._open_sqlite()
+        cls.sqlite_local = threading.local()
+        conn.execute("""
             CREATE TABLE IF NOT EXISTS reflections(
-              id INTEGER PRIMARY KEY AUTOINCREMENT,
+              id INTEGER PRIMARY KEY,
               user_id TEXT NOT NULL,
               thread_id TEXT NOT NULL,
               slide_id TEXT NOT NULL,
@@ -137,73 +401,210 @@ class DB:
               ts INTEGER NOT NULL
             );
         """)
-        cls.sqlite.commit()
+        for ddl in SQLITE_INDEXES:
+            conn.execute(ddl)
+        conn.commit()
         cls.kind = "sqlite"
+        if SQLITE_OPTIMIZE_INTERVAL > 0:
+            threading.Thread(target=cls._sqlite_optimize_loop, name="sqlite-optimize", daemon=True).start()
+
+    @classmethod
+    def _sqlite_optimize_loop(cls):
+        # Long-lived process: refresh planner stats now and then (cheap no-op when nothing changed).
+        # "PRAGMA optimize" only considers tables this connection's planner has touched, so plan
+        # the real SELECTs first (EXPLAIN QUERY PLAN runs nothing); 0x10000 = check all tables on
+        # SQLite >= 3.46, ignored by older versions.
+        conn = cls._open_sqlite()
+        while True:
+            time.sleep(SQLITE_OPTIMIZE_INTERVAL)
+            try:
+                for sql in cls.SELECT_SQL.values():
+                    conn.execute("EXPLAIN QUERY PLAN " + sql, (None,) * sql.count("?")).fetchall()
+                conn.execute("PRAGMA optimize=0x10002")
+            except Exception as e: print(f"[DB] PRAGMA optimize failed: {e}")
+
+    @classmethod
+    def ensure_init(cls):
+        """Initialize once per process (first request or gunicorn post_fork), retrying with backoff."""
+        if cls.inited: return True
+        with cls.init_lock:
+            if cls.inited: return True
+            for attempt in range(1, DB_INIT_RETRIES + 1):
+                try:
+                    cls.init()
+                    cls.inited = True
+                    return True
+                except Exception as e:
+                    print(f"[DB] Init attempt {attempt}/{DB_INIT_RETRIES} failed: {e}")
+                    if attempt < DB_INIT_RETRIES:
+                        time.sleep(0.5 * 2 ** (attempt - 1))
+            return False
 
     @classmethod
     def init(cls):
         if not cls.try_postgres():
             cls.init_sqlite()
+        cls.compile_sql()
+        cls.start_writer()
+
+    @classmethod
+    def compile_sql(cls):
+        """Build every statement once for the active backend; SELECTs keyed by (filter bitmask, has_before)."""
+        ph, cols = cls.placeholder, ",".join(COLS)
+        cls.INSERT_SQL = f"INSERT INTO reflections({cols}) VALUES({','.join([ph] * len(COLS))})"
+        cls.INSERT_VALUES_SQL = f"INSERT INTO reflections({cols}) VALUES %s"
+        cls.SELECT_SQL = {}
+        for mask in range(1 << len(FILTER_KEYS)):
+            for has_before in (False, True):
+                clauses = [f"{k} = {ph}" for i, k in enumerate(FILTER_KEYS) if mask >> i & 1]
+                if has_before: clauses.append(f"ts < {ph}")
+                where_sql = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+                cls.SELECT_SQL[mask, has_before] = (
+                    f"SELECT {cols} FROM reflections {where_sql}ORDER BY ts DESC LIMIT {ph}")
 
     @classmethod
     def insert_reflection(cls, rec):
+        pending = PendingWrite(rec)
+        cls.write_queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return rec["slide_id"]
+
+    # ---- Group-commit writer ----
+    @classmethod
+    def start_writer(cls):
+        threading.Thread(target=cls._writer_loop, name="db-writer", daemon=True).start()
+
+    @classmethod
+    def _drain_batch(cls):
+        # Block for one item, then take whatever queued up meanwhile: batches form on their
+        # own while the previous commit is in flight, and a lone save on an idle server waits
+        # for nothing. WRITE_BATCH_WAIT_MS > 0 optionally lingers for stragglers.
+        batch = [cls.write_queue.get()]
+        deadline = time.monotonic() + WRITE_BATCH_WAIT
+        while len(batch) < WRITE_BATCH_MAX:
+            try:
+                batch.append(cls.write_queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0: break
+            try: batch.append(cls.write_queue.get(timeout=remaining))
+            except queue.Empty: break
+        return batch
+
+    @classmethod
+    def _writer_loop(cls):
+        while True:
+            batch = cls._drain_batch()
+            now = now_s()  # one clock read stamps the whole batch
+            for p in batch: p.rec["ts"] = now
+            try:
+                cls._write_batch([p.rec for p in batch])
+                cls.write_epoch += 1
+            except Exception as e:
+                print(f"[DB] Batch write failed ({len(batch)} rows): {e}")
+                for p in batch: p.error = e
+            for p in batch: p.done.set()
+
+    @classmethod
+    def _write_batch(cls, recs):
+        rows = [(r["user_id"], r["thread_id"], r["slide_id"], r["glyph_echo"], r["drift_score"],
+                 r["seal"], r["role"], r["content"], r.get("checksum_kappa"), r["ts"]) for r in recs]
         if cls.kind == "postgres":
             with cls.get_pg_conn() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(f"""
-                        INSERT INTO reflections(user_id,thread_id,slide_id,glyph_echo,drift_score,
-                                                seal,role,content,checksum_kappa,ts)
-                        VALUES({cls.placeholder},{cls.placeholder},{cls.placeholder},{cls.placeholder},
-                               {cls.placeholder},{cls.placeholder},{cls.placeholder},{cls.placeholder},
-                               {cls.placeholder},{cls.placeholder});
-                    """, (rec["user_id"], rec["thread_id"], rec["slide_id"], rec["glyph_echo"],
-                          rec["drift_score"], rec["seal"], rec["role"], rec["content"],
-                          rec.get("checksum_kappa"), rec["ts"]))
-                conn.commit()
-            return rec["slide_id"]
+                try:
+                    with conn.cursor() as cur:
+                        # The whole drained batch goes out as one multi-row INSERT: one round-trip.
+                        # (No COPY path: a batch never exceeds the number of request threads, far
+                        # below the size where COPY beats a single execute_values statement.)
+                        cls.pg_extras.execute_values(cur, cls.INSERT_VALUES_SQL, rows, page_size=len(rows))
+                    conn.commit()
+                except Exception:
+                    # A dead connection can't roll back; surface the original error, not that one
+                    try: conn.rollback()
+                    except Exception: pass
+                    raise
         else:
-            cls.sqlite.execute("""
-                INSERT INTO reflections(user_id,thread_id,slide_id,glyph_echo,drift_score,
-                                        seal,role,content,checksum_kappa,ts)
-                VALUES(?,?,?,?,?,?,?,?,?,?)
-            """, (rec["user_id"], rec["thread_id"], rec["slide_id"], rec["glyph_echo"],
-                  rec["drift_score"], rec["seal"], rec["role"], rec["content"],
-                  rec.get("checksum_kappa"), rec["ts"]))
-            cls.sqlite.commit()
-            return rec["slide_id"]
+            conn = cls.sqlite_writer
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(cls.INSERT_SQL, rows)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    @classmethod
+    def select_key(cls, filters, limit:int, before_ts:int|None=None):
+        return (tuple((k, filters[k]) for k in FILTER_KEYS if filters.get(k)), limit, before_ts)
+
+    @classmethod
+    def select_reflections(cls, filters, limit:int, before_ts:int|None=None, gen=None):
+        """Rows come back as plain tuples in COLS order; the route builds the JSON objects."""
+        key = cls.select_key(filters, limit, before_ts)
+        if gen is None: gen = cls.read_generation()
+        rows = SELECT_CACHE.get(gen, key)
+        if rows is None:
+            rows = tuple(cls.query_reflections(filters, limit, before_ts))
+            SELECT_CACHE.put(gen, key, rows, _rows_nbytes(rows))
+        return rows
+
+    @classmethod
+    def read_generation(cls):
+        """Identical GET filters are memoized for GET_CACHE_TTL seconds or until the next write."""
+        return (now_s() // GET_CACHE_TTL, cls.write_epoch)
 
     @classmethod
-    def select_reflections(cls, filters, limit:int, before_ts:int|None=None):
-        clauses, params = [], []
-        for key in ("user_id","thread_id","slide_id","seal","role"):
+    def _select_args(cls, filters, limit, before_ts):
+        mask, params = 0, []
+        for i, key in enumerate(FILTER_KEYS):
             val = filters.get(key)
             if val:
-                clauses.append(f"{key} = {cls.placeholder}")
+                mask |= 1 << i
                 params.append(val)
         if before_ts:
-            clauses.append(f"ts < {cls.placeholder}")
             params.append(before_ts)
-        where_sql = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(limit)
+        return cls.SELECT_SQL[mask, bool(before_ts)], params
+
+    @classmethod
+    def query_reflections(cls, filters, limit:int, before_ts:int|None=None):
+        sql, params = cls._select_args(filters, limit, before_ts)
         if cls.kind == "postgres":
             with cls.get_pg_conn() as conn:
-                with conn.cursor(cursor_factory=cls.pg_extras.RealDictCursor) as cur:
-                    cur.execute(f"""
-                        SELECT user_id,thread_id,slide_id,glyph_echo,drift_score,seal,role,content,
-                               checksum_kappa,ts
-                        FROM reflections {where_sql}
-                        ORDER BY ts DESC LIMIT {cls.placeholder};
-                    """, params + [limit])
-                    rows = cur.fetchall()
-            return [dict(r) for r in rows]
+                with conn.cursor() as cur:
+                    cur.execute(sql, params)
+                    return cur.fetchall()
         else:
-            rows = cls.sqlite.execute(f"""
-                SELECT user_id,thread_id,slide_id,glyph_echo,drift_score,seal,role,content,
-                       checksum_kappa,ts
-                FROM reflections {where_sql} ORDER BY ts DESC LIMIT ?
-            """, params + [limit]).fetchall()
-            return [dict(r) for r in rows]
+            return cls.sqlite_conn().execute(sql, params).fetchall()
 
-DB.init()
+    @classmethod
+    def iter_reflections(cls, filters, limit:int, before_ts:int|None=None):
+        """Yield rows straight off the cursor (server-side on Postgres) so large reads stay bounded."""
+        sql, params = cls._select_args(filters, limit, before_ts)
+        if cls.kind == "postgres":
+            with cls.get_pg_conn() as conn:
+                with conn.cursor(name="refl_stream") as cur:
+                    cur.itersize = STREAM_FETCH_ROWS
+                    cur.execute(sql, params)
+                    yield from cur
+        else:
+            yield from cls.sqlite_conn().execute(sql, params)
+
+SELECT_CACHE = GenerationCache(GET_CACHE_MAX_BYTES)  # (filters, limit, before_ts) -> rows
+
+def _rows_nbytes(rows):
+    # Text columns dominate (content up to MAX_CONTENT_CHARS); ~200 B/row covers the rest
+    return sum(len(v) for r in rows for v in r if type(v) is str) + 200 * len(rows) + 64
+
+# Not initialized at import: each worker connects after fork, on its first request
+@app.before_request
+def _lazy_init():
+    if not DB.ensure_init():
+        return ojson({"ok": False, "error": "Storage unavailable"}, 503)
 
 # ---------- Keepalive ----------
 def _keepalive():
@@ -213,11 +614,12 @@ def _keepalive():
         print("[KEEPALIVE] Disabled (no SELF_HEALTH_URL)")
         return
     print(f"[KEEPALIVE] Active: triple ping to {url} every {interval}s")
+    session = requests.Session()  # one pooled connection: no TCP/TLS handshake per ping
     while True:
         for i in range(3):
             try:
-                requests.get(url, timeout=10)
-                print(f"[KEEPALIVE] Ping {i+1}/3 -> 200 @ {int(time.time())}")
+                r = session.get(url, timeout=10)
+                print(f"[KEEPALIVE] Ping {i+1}/3 -> {r.status_code} @ {now_s()}")
             except Exception as e:
                 print(f"[KEEPALIVE] Error {i+1}/3: {e}")
             time.sleep(2)
@@ -227,110 +629,304 @@ if os.getenv("ENABLE_KEEPALIVE", "true").lower() in ("1","true","yes","on"):
     threading.Thread(target=_keepalive, daemon=True).start()
 
 # ---------- Auth ----------
+_MEMORY_API_KEY_B = MEMORY_API_KEY.encode()
+
 def _auth_ok():
     if not MEMORY_API_KEY: return False
-    h = request.headers
-    k1, k2 = h.get("X-API-Key",""), h.get("X-API-KEY","")
-    auth = h.get("Authorization","")
-    bearer = auth.split(" ",1)[1].strip() if auth.lower().startswith("bearer ") else ""
-    return any(x == MEMORY_API_KEY for x in (k1,k2,bearer))
+    # Straight environ reads skip EnvironHeaders' key normalization; X-API-KEY maps to the same key
+    env = request.environ
+    k = env.get("HTTP_X_API_KEY", "")
+    if k and hmac.compare_digest(k.encode(), _MEMORY_API_KEY_B):
+        return True
+    auth = env.get("HTTP_AUTHORIZATION", "")
+    if auth[:7].lower() == "bearer ":
+        return hmac.compare_digest(auth[7:].strip().encode(), _MEMORY_API_KEY_B)
+    return False
+
+PUBLIC_PATHS = frozenset(("/", "/health", "/openapi.json"))
 
 def require_key(fn):
     @wraps(fn)
     def wrapped(*args, **kwargs):
-        if request.method == "OPTIONS" or request.path in ("/", "/health"):
+        if request.path in PUBLIC_PATHS:
             return fn(*args, **kwargs)
         if not _auth_ok():
-            return jsonify({"ok": False, "error": "Unauthorized"}), 401
+            return ojson({"ok": False, "error": "Unauthorized"}, 401)
         return fn(*args, **kwargs)
     return wrapped
 
 # ---------- CORS ----------
-@app.after_request
-def add_headers(resp):
-    origin = request.headers.get("Origin", "")
-    if ALLOWED_ORIGIN == "*" or origin in [o.strip() for o in ALLOWED_ORIGIN.split(",")]:
-        resp.headers["Access-Control-Allow-Origin"] = origin or "*"
-        resp.headers["Access-Control-Allow-Headers"] = "Content-Type, X-API-Key, Authorization"
-        resp.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
-        resp.headers["Access-Control-Max-Age"] = "600"
-        resp.headers["Vary"] = "Origin"
+# ALLOWED_ORIGIN is fixed at boot, so pick the matching after_request hook once
+_CORS_WILDCARD = ALLOWED_ORIGIN == "*"
+_ALLOWED_SET = frozenset(o.strip() for o in ALLOWED_ORIGIN.split(",") if o.strip())
+_CORS_HEADERS = {
+    "Access-Control-Allow-Headers": "Content-Type, X-API-Key, Authorization, If-None-Match",
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+    "Access-Control-Expose-Headers": "ETag",
+    "Access-Control-Max-Age": "600",
+    "Vary": "Origin",
+}
+_CORS_HEADERS_ANY = {"Access-Control-Allow-Origin": "*", **_CORS_HEADERS}
+
+def _add_headers_wildcard(resp):
+    origin = request.environ.get("HTTP_ORIGIN")
+    if origin:
+        resp.headers["Access-Control-Allow-Origin"] = origin
+        resp.headers.update(_CORS_HEADERS)
+    else:
+        # Probes and server-to-server calls: one update with a fully prebuilt header set
+        resp.headers.update(_CORS_HEADERS_ANY)
     return resp
 
+def _add_headers_allowlist(resp):
+    origin = request.environ.get("HTTP_ORIGIN", "")
+    if origin in _ALLOWED_SET:
+        resp.headers["Access-Control-Allow-Origin"] = origin
+        resp.headers.update(_CORS_HEADERS)
+    return resp
+
+add_headers = app.after_request(_add_headers_wildcard if _CORS_WILDCARD else _add_headers_allowlist)
+
+# Preflights are answered at the WSGI layer (see _fast_wsgi) from these prebuilt header lists
+_PREFLIGHT_BASE = [("Content-Length", "0"), *_CORS_HEADERS.items()]
+_PREFLIGHT_ANY = [("Content-Length", "0"), *_CORS_HEADERS_ANY.items()]
+
+def _preflight_headers(origin):
+    if _CORS_WILDCARD:
+        return [("Access-Control-Allow-Origin", origin), *_PREFLIGHT_BASE] if origin else _PREFLIGHT_ANY
+    if origin in _ALLOWED_SET:
+        return [("Access-Control-Allow-Origin", origin), *_PREFLIGHT_BASE]
+    return _PREFLIGHT_BASE[:1]  # disallowed origin: no CORS headers, same as add_headers
+
 # ---------- Routes ----------
+# GET bodies carry a weak ETag over their encoded bytes; a matching If-None-Match
+# gets an empty 304, so polling clients skip the download when nothing changed.
+def _etag(body):
+    return 'W/"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+def _etag_match(inm, etag):
+    """The If-None-Match tag that matches `etag`, else None; a 304 must echo that exact tag.
+
+    Flask-Compress rewrites W/"h" to W/"h:gzip", so tags match on the open-quoted prefix.
+    """
+    if not inm: return None
+    if inm == etag: return etag
+    prefix = etag[:-1]
+    for tag in inm.split(","):
+        tag = tag.strip()
+        if tag == "*": return etag
+        if tag.startswith(prefix): return tag
+    return None
+
+def _conditional(body, etag=None):
+    etag = etag or _etag(body)
+    matched = _etag_match(request.environ.get("HTTP_IF_NONE_MATCH"), etag)
+    if matched:
+        return app.response_class(status=304, headers={"ETag": matched})
+    return app.response_class(body, mimetype="application/json",
+                              headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+# Probe endpoints serve pre-serialized bytes: root is static per backend,
+# health is re-encoded (with its ETag) at most once per second (its only dynamic field is ts).
+_HEALTH_CACHED = (0, b"", "")
+
+@lru_cache(maxsize=None)
+def _root_body(kind):
+    return orjson.dumps({"ok": True, "service": "DavePMEi Reflection API", "mode": "dual", "storage": kind})
+
+def _health_body():
+    global _HEALTH_CACHED
+    now = now_s()
+    if _HEALTH_CACHED[0] != now:
+        body = orjson.dumps({"ok": True, "ts": now, "storage": DB.kind, "mode": "dual"})
+        _HEALTH_CACHED = (now, body, _etag(body))
+    return _HEALTH_CACHED
+
 @app.route("/")
 def root():
-    return jsonify({"ok": True, "service": "DavePMEi Reflection API", "mode": "dual", "storage": DB.kind})
+    return app.response_class(_root_body(DB.kind), mimetype="application/json")
 
 @app.route("/health")
 def health():
-    return jsonify({"ok": True, "ts": int(time.time()), "storage": DB.kind, "mode": "dual"})
+    _, body, etag = _health_body()
+    return _conditional(body, etag)
+
+# The schema is static: read and gzip it once at import, then serve straight from memory
+_OPENAPI_PATH = Path(__file__).with_name(OPENAPI_FILENAME)
+_OPENAPI = None
+if _OPENAPI_PATH.is_file():
+    _raw = _OPENAPI_PATH.read_bytes()
+    _OPENAPI = (_raw, gzip.compress(_raw, 9), _etag(_raw))
+
+@app.route("/openapi.json")
+def openapi_spec():
+    if _OPENAPI is None:
+        return ojson({"ok": False, "error": "Not found"}, 404)
+    raw, gz, etag = _OPENAPI
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=300", "Vary": "Accept-Encoding"}
+    matched = _etag_match(request.environ.get("HTTP_IF_NONE_MATCH"), etag)
+    if matched:
+        return app.response_class(status=304, headers={**headers, "ETag": matched})
+    if "gzip" in request.environ.get("HTTP_ACCEPT_ENCODING", ""):
+        return app.response_class(gz, mimetype="application/json", headers={**headers, "Content-Encoding": "gzip"})
+    return app.response_class(raw, mimetype="application/json", headers=headers)
+
+_flask_wsgi = app.wsgi_app
+
+def _fast_wsgi(environ, start_response):
+    # Preflights never need the app (or the DB): 204 with static CORS headers, no hooks.
+    method = environ.get("REQUEST_METHOD")
+    if method == "OPTIONS":
+        start_response("204 NO CONTENT", _preflight_headers(environ.get("HTTP_ORIGIN")))
+        return []
+    # Probers hit GET /health with no Origin: skip Flask's request object, routing and hooks.
+    # Cross-origin, conditional or pre-init requests fall through so CORS, 304 and 503 still apply.
+    if (environ.get("PATH_INFO") == "/health" and method == "GET"
+            and "HTTP_ORIGIN" not in environ and "HTTP_IF_NONE_MATCH" not in environ and DB.inited):
+        _, body, etag = _health_body()
+        start_response("200 OK", [("Content-Type", "application/json"), ("Content-Length", str(len(body))),
+                                  ("ETag", etag), ("Cache-Control", "private, no-cache")])
+        return [body]
+    return _flask_wsgi(environ, start_response)
+
+app.wsgi_app = _fast_wsgi
 
 # ---- LEGACY MEMORY ----
 @app.route("/save_memory", methods=["POST", "OPTIONS"])
 @require_key
 def save_memory():
-    if request.method == "OPTIONS": return ("", 204)
     return _save_reflection_internal(legacy=True)
 
 @app.route("/get_memory", methods=["GET", "OPTIONS"])
 @require_key
 def get_memory():
-    if request.method == "OPTIONS": return ("", 204)
     return _get_reflection_internal(legacy=True)
 
 # ---- LAWFUL REFLECTION ----
 @app.route("/save_reflection", methods=["POST", "OPTIONS"])
 @require_key
 def save_reflection():
-    if request.method == "OPTIONS": return ("", 204)
     return _save_reflection_internal(legacy=False)
 
 @app.route("/get_reflection", methods=["GET", "OPTIONS"])
 @require_key
 def get_reflection():
-    if request.method == "OPTIONS": return ("", 204)
     return _get_reflection_internal(legacy=False)
 
+# ---------- Errors ----------
+# JSON bodies for HTTP errors are encoded once per status code; anything that is not an
+# HTTPException is logged in full and reported as a bare 500 so internals never leak.
+@lru_cache(maxsize=None)
+def _error_body(code, name):
+    return orjson.dumps({"ok": False, "error": name, "code": code})
+
+@app.errorhandler(HTTPException)
+def on_http_error(e):
+    # Keep the exception's own headers (Allow on 405, Retry-After, ...) but swap in a JSON body
+    headers = [(k, v) for k, v in e.get_headers() if k.lower() != "content-type"]
+    return app.response_class(_error_body(e.code, e.name), status=e.code, headers=headers,
+                              mimetype="application/json")
+
+@app.errorhandler(Exception)
+def on_error(e):
+    app.logger.exception(e)
+    return app.response_class(_error_body(500, "internal"), status=500, mimetype="application/json")
+
 # ---------- Core Logic ----------
 def _save_reflection_internal(legacy=False):
     if not rate_limit_ok(f"save:{request.remote_addr}", max_per_min=120):
-        return jsonify({"ok": False, "error": "Rate limit"}), 429
-    d = request.get_json(silent=True) or {}
-    user_id = str(d.get("user_id", "")).strip()
-    thread_id = (str(d.get("thread_id", "general")).strip() or "general")[:64]
-    content = str(d.get("content", "")).strip()
-    if not user_id or not content:
-        return jsonify({"ok": False, "error": "Missing user_id or content"}), 400
-    drift = clamp_drift(d.get("drift_score", 0.10))
-    glyph = sanitize_glyph(d.get("glyph_echo", "🪞"))
-    seal = sanitize_seal(d.get("seal", "lawful"))
-    role = (str(d.get("role", "assistant")).strip() or "assistant")[:32]
-    kappa = sanitize_kappa(d.get("checksum_kappa", "verified"))
-    slide_id = str(d.get("slide_id", "")).strip()
-    if not slide_id or not SLIDE_RE.match(slide_id):
+        return ojson({"ok": False, "error": "Rate limit"}, 429)
+    try: req = SAVE_DECODER.decode(request.get_data(cache=False) or b"{}")
+    except msgspec.ValidationError as e:
+        return ojson({"ok": False, "error": f"Invalid payload: {e}"}, 400)
+    except msgspec.DecodeError:
+        return ojson({"ok": False, "error": "Invalid JSON"}, 400)
+    if not req.user_id or not req.content:
+        return ojson({"ok": False, "error": "Missing user_id or content"}, 400)
+    mode = "lawful" if not legacy else "legacy"
+    slide_id = req.slide_id
+    dedup_key = None
+    if is_slide_id(slide_id):
+        # A client-chosen slide_id makes retries recognizable: answer a repeat without a write
+        dedup_key = (req.user_id, req.thread_id, slide_id, hash(req.content))
+        with RECENT_SAVES_LOCK: seen_ts = RECENT_SAVES.get(dedup_key)
+        if seen_ts is not None and now_s() - seen_ts <= RECENT_SAVE_WINDOW:
+            return ojson({"ok": True, "mode": mode, "status": "duplicate",
+                          "slide_id": slide_id, "ts": seen_ts, "checksum_kappa": req.checksum_kappa}, 200)
+    else:
         prefix = "r-" if not legacy else "t-"
-        slide_id = f"{prefix}{int(time.time()) % 1000000:06d}"
-    rec = dict(user_id=user_id, thread_id=thread_id, slide_id=slide_id,
-               glyph_echo=glyph, drift_score=drift, seal=seal, role=role,
-               content=content, checksum_kappa=kappa, ts=int(time.time()))
-    out_id = DB.insert_reflection(rec)
-    return jsonify({"ok": True, "mode": "lawful" if not legacy else "legacy",
-                    "slide_id": out_id, "ts": rec["ts"], "checksum_kappa": kappa}), 201
+        slide_id = f"{prefix}{now_s() % 1000000:06d}"
+    rec = dict(user_id=req.user_id, thread_id=req.thread_id, slide_id=slide_id,
+               glyph_echo=req.glyph_echo, drift_score=req.drift_score, seal=req.seal, role=req.role,
+               content=req.content, checksum_kappa=req.checksum_kappa)
+    out_id = DB.insert_reflection(rec)  # the writer stamps rec["ts"] per committed batch
+    if dedup_key is not None:
+        with RECENT_SAVES_LOCK: RECENT_SAVES.put(dedup_key, rec["ts"])
+    return ojson({"ok": True, "mode": mode,
+                  "slide_id": out_id, "ts": rec["ts"], "checksum_kappa": req.checksum_kappa}, 201)
 
 def _get_reflection_internal(legacy=False):
     if not rate_limit_ok(f"get:{request.remote_addr}", max_per_min=240):
-        return jsonify({"ok": False, "error": "Rate limit"}), 429
+        return ojson({"ok": False, "error": "Rate limit"}, 429)
     args = request.args
-    filters = {k: args.get(k) for k in ("user_id","thread_id","slide_id","seal","role")}
+    filters = {k: args.get(k) for k in FILTER_KEYS}
     limit = max(1, min(int(args.get("limit", "50")), 200))
     before_ts = int(args.get("before_ts")) if args.get("before_ts") else None
-    items = DB.select_reflections(filters, limit, before_ts)
-    next_cursor = items[-1]["ts"] if items else None
-    return jsonify({"ok": True, "mode": "lawful" if not legacy else "legacy",
-                    "count": len(items), "next_before_ts": next_cursor, "items": items}), 200
-
-# ---------- Local run ----------
-if __name__ == "__main__":
-    port = int(os.getenv("PORT", "10000"))
-    app.run(host="0.0.0.0", port=port)
+    mode = "lawful" if not legacy else "legacy"
+    if limit <= GET_CACHE_MAX_LIMIT:
+        body, etag = _encode_page(filters, limit, before_ts, mode)
+        return _conditional(body, etag)
+    body = _stream_items(mode, DB.iter_reflections(filters, limit, before_ts))
+    first = next(body)  # runs the query now, so DB errors still surface as a 500
+    body = itertools.chain((first,), body)
+    if "gzip" not in request.environ.get("HTTP_ACCEPT_ENCODING", ""):
+        return app.response_class(body, mimetype="application/json")
+    return app.response_class(_gzip_stream(body), mimetype="application/json",
+                              headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+
+def _gzip_stream(chunks):
+    z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out: yield out
+    yield z.flush()
+
+PAGE_CACHE = GenerationCache(GET_CACHE_MAX_BYTES)  # (select key, mode) -> (body, etag)
+
+def _encode_page(filters, limit, before_ts, mode):
+    # Keyed like SELECT_CACHE (a few short strings and ints, cheap to hash), so repeat polls
+    # skip the query, the per-row dicts, the encode and the ETag hash altogether. One
+    # generation is read up front and used for both caches, so a write landing mid-request
+    # can only make an entry newer than its generation, never older.
+    gen = DB.read_generation()
+    key = (DB.select_key(filters, limit, before_ts), mode)
+    page = PAGE_CACHE.get(gen, key)
+    if page is None:
+        rows = DB.select_reflections(filters, limit, before_ts, gen)
+        items = [dict(zip(COLS, r)) for r in rows]
+        body = orjson.dumps({"ok": True, "mode": mode, "count": len(items),
+                             "next_before_ts": rows[-1][TS_COL] if rows else None, "items": items})
+        page = (body, _etag(body))
+        PAGE_CACHE.put(gen, key, page, len(body))
+    return page
+
+def _stream_items(mode, rows):
+    """Encode the GET envelope incrementally, flushing roughly STREAM_CHUNK_BYTES at a time."""
+    rows = iter(rows)
+    first = next(rows, None)
+    buf = [b'{"ok":true,"mode":' + orjson.dumps(mode) + b',"items":[']
+    size, count, last_ts = 0, 0, None
+    if first is not None:
+        for r in itertools.chain((first,), rows):
+            part = orjson.dumps(dict(zip(COLS, r)))
+            buf.append(b"," + part if count else part)
+            size += len(part)
+            count += 1
+            last_ts = r[TS_COL]
+            if size >= STREAM_CHUNK_BYTES:
+                yield b"".join(buf)
+                buf, size = [], 0
+    buf.append(b'],"count":' + orjson.dumps(count) + b',"next_before_ts":' + orjson.dumps(last_ts) + b"}")
+    yield b"".join(buf)
+
+# Serve with: gunicorn -c gunicorn_conf.py server:app